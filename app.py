@@ -2,14 +2,26 @@
 
 import streamlit as st
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 import io
 import os
 from dotenv import load_dotenv
 import streamlit.components.v1 as components
-import base64
+import re
+import time
+import threading
+import pickle
+import uuid
+import random
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import pathlib
+import tempfile
 
 # Load environment variables at the very beginning of the script.
 load_dotenv()
@@ -40,8 +52,149 @@ else:
     st.error("Google API Key not found. Please set it in your secrets or .env file.")
     st.stop()
 
+# On-disk cache shared by every session and preserved across restarts.
+CACHE_DIR = pathlib.Path(".cache")
+
+def write_cache_file(path, data):
+    """Writes bytes through a temp file in the same directory, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        pathlib.Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+# Stability.ai endpoint and headers are fixed for the lifetime of the process.
+STABILITY_API_URL = "https://api.stability.ai/v1/generation/{engine_id}/text-to-image"
+STABILITY_HEADERS = {
+    "Accept": "image/png",
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {STABILITY_API_KEY}",
+}
+
+@st.cache_resource
+def get_stability_session():
+    """Creates a pooled HTTP session so the Stability.ai connection is reused across chapters."""
+    session = requests.Session()
+    # Only connection failures are retried here. read=0: a POST that timed out may still finish (and be billed)
+    # server-side, so it is never resent. Status retries live in request_stability_image, where each one is rate limited.
+    retries = Retry(total=3, read=0, status=0, backoff_factor=0.5)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries))
+    return session
+
+@st.cache_resource
+def warm_stability_connection():
+    """Opens the Stability.ai connection in the background once per process, ahead of the first image."""
+    session = get_stability_session()
+
+    def warm():
+        try:
+            session.get("https://api.stability.ai/v1/user/account", headers={"Authorization": f"Bearer {STABILITY_API_KEY}"}, timeout=5)
+        except requests.exceptions.RequestException:
+            pass  # Best effort: the first real request will simply connect on its own.
+
+    threading.Thread(target=warm, daemon=True).start()
+
+if STABILITY_API_KEY:
+    warm_stability_connection()
+
+# Throttling and transient server errors from Stability.ai that are worth another attempt.
+RETRYABLE_STABILITY_STATUSES = {429, 500, 502, 503, 504}
+STABILITY_MAX_ATTEMPTS = 4
+
+# SDXL only accepts a fixed set of ~1 megapixel sizes, so the fast preset uses the v1.6 engine at 768x768.
+IMAGE_QUALITY_PRESETS = {
+    "Fast (768/20)": {"engine_id": "stable-diffusion-v1-6", "height": 768, "width": 768, "steps": 20},
+    "Balanced (1024/25)": {"engine_id": "stable-diffusion-xl-1024-v1-0", "height": 1024, "width": 1024, "steps": 25},
+    "Max (1024/30)": {"engine_id": "stable-diffusion-xl-1024-v1-0", "height": 1024, "width": 1024, "steps": 30},
+}
+
+class TokenBucket:
+    """Thread-safe token bucket that makes callers wait for a free request slot."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+@st.cache_resource
+def get_stability_rate_limiter():
+    """Process-wide limit on outbound Stability.ai requests (free-tier friendly)."""
+    return TokenBucket(rate=2, burst=4)
+
+@st.cache_resource
+def get_gemini_rate_limiter():
+    """Process-wide limit on outbound Gemini requests."""
+    return TokenBucket(rate=1, burst=4)
+
 # --- 2. AI and Helper Functions ---
 
+# Transient Gemini failures (throttling, overload) that are worth retrying.
+RETRYABLE_GEMINI_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+)
+
+def with_retry(fn, *args, retries=3, rate_limiter=None, **kwargs):
+    """Calls fn, retrying transient Gemini errors with jittered exponential backoff."""
+    for attempt in range(retries):
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except RETRYABLE_GEMINI_ERRORS:
+            if attempt == retries - 1:
+                raise
+            time.sleep(min(2 ** attempt, 8) + random.random())
+
+@st.cache_resource
+def get_gemini_model():
+    """Creates the Gemini model client once and keeps it alive across reruns."""
+    return genai.GenerativeModel('gemini-1.5-flash-latest')
+
+# Gemini responses on disk are reused for up to a week, keyed on the prompt and sampling temperature.
+GEMINI_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+def gemini_cache_path(prompt, generation_config=None):
+    """Locates the disk-cache entry for a Gemini prompt."""
+    temperature = generation_config.temperature if generation_config else None
+    cache_key = hashlib.sha256(f"{prompt}{temperature}".encode()).hexdigest()
+    return CACHE_DIR / "gemini" / f"{cache_key}.json"
+
+def read_gemini_cache(cache_path):
+    """Returns a cached Gemini result, or None if it is missing, expired, or unreadable."""
+    try:
+        if time.time() - cache_path.stat().st_mtime < GEMINI_CACHE_TTL_SECONDS:
+            return json.loads(cache_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        pass
+    except (json.JSONDecodeError, UnicodeDecodeError, OSError):
+        # A torn entry would otherwise poison this prompt until it expires; treat it as a miss.
+        cache_path.unlink(missing_ok=True)
+    return None
+
+def write_gemini_cache(cache_path, value):
+    """Stores a Gemini result so later sessions can replay it."""
+    write_cache_file(cache_path, json.dumps(value).encode("utf-8"))
+
 @st.cache_data
 def generate_world_bible(theme, archetype, contradiction):
     """Generates the story's core rules and tone using Gemini."""
@@ -51,69 +204,115 @@ def generate_world_bible(theme, archetype, contradiction):
     Protagonist Archetype: {archetype}
     The World's Core Contradiction: {contradiction}
     """
+    cache_path = gemini_cache_path(prompt)
+    cached = read_gemini_cache(cache_path)
+    if cached is not None:
+        return cached
+
     with st.spinner("Generating the core of your universe..."):
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        response = model.generate_content(prompt)
+        model = get_gemini_model()
+        response = with_retry(model.generate_content, prompt, rate_limiter=get_gemini_rate_limiter())
+        write_gemini_cache(cache_path, response.text)
         return response.text
 
-@st.cache_data
-def generate_story_chapter(_story_context, _world_bible, user_choice):
-    """Generates the next narrative chapter, choices, and image prompt."""
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')
-    generation_config = genai.types.GenerationConfig(temperature=0.9)
-    prompt = f"""
+# Matches a markdown code fence wrapped around the whole response, leaving backticks inside the story untouched.
+CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+CHAPTER_GENERATION_CONFIG = genai.types.GenerationConfig(temperature=0.9)
+
+def build_chapter_prompt(story_context, world_bible, user_choice):
+    """Builds the Storytelling Engine prompt for the next chapter."""
+    return f"""
     You are a multi-persona Storytelling Engine. Follow these steps precisely.
     The user's choice for the last chapter was: "{user_choice}".
-    The full story context so far is: "{_story_context}".
-    The secret World Bible for this universe is: "{_world_bible}".
+    The full story context so far is: "{story_context}".
+    The secret World Bible for this universe is: "{world_bible}".
 
     Step 1: Act as a Literary Artist. Write a rich, descriptive paragraph expanding on the user's choice.
     Step 2: Act as a Plot Theorist. Based on the new paragraph, generate three distinct, single-sentence plot choices. One must be a 'Wildcard'. Format these choices as a valid JSON array of strings.
     Step 3: Act as an Art Director. Based the paragraph from Step 1, write a concise, descriptive prompt for an AI image generator (comma-separated keywords).
     Step 4: Format your entire response as a single, raw JSON object with NO markdown formatting, using these exact keys: "narrative_chapter", "next_choices", and "image_prompt".
     """
+
+def parse_chapter_response(text):
+    """Parses the chapter JSON returned by Gemini, tolerating a surrounding code fence."""
+    return json.loads(CODE_FENCE_RE.sub("", text).strip())
+
+@st.cache_data
+def generate_story_chapter(_story_context, _world_bible, user_choice, replay_mode=False):
+    """Generates the next narrative chapter, choices, and image prompt."""
+    model = get_gemini_model()
+    prompt = build_chapter_prompt(_story_context, _world_bible, user_choice)
+    # Chapters are sampled at a high temperature, so they are only replayed from disk when asked to.
+    cache_path = gemini_cache_path(prompt, CHAPTER_GENERATION_CONFIG)
+    if replay_mode:
+        cached = read_gemini_cache(cache_path)
+        if cached is not None:
+            return cached
+
     with st.spinner("The Storyteller is weaving the next chapter..."):
         try:
-            response = model.generate_content(prompt, generation_config=generation_config)
-            cleaned_json_string = response.text.strip().replace("```json", "").replace("```", "").strip()
-            data = json.loads(cleaned_json_string)
+            response = with_retry(model.generate_content, prompt, generation_config=CHAPTER_GENERATION_CONFIG, rate_limiter=get_gemini_rate_limiter())
+            data = parse_chapter_response(response.text)
+            if replay_mode:
+                write_gemini_cache(cache_path, data)
             return data
         except Exception as e:
             st.error(f"Error processing AI response: {e}. The AI may have returned an unexpected format.")
             st.code(response.text)
             return None
 
-@st.cache_data
-def generate_image_stability(prompt):
-    """Generates an image using the Stability.ai API with a valid model."""
-    if not STABILITY_API_KEY:
-        st.warning("Stability API Key not found. Image generation is disabled.")
-        return None
-
-    engine_id = "stable-diffusion-xl-1024-v1-0"
-    API_URL = f"https://api.stability.ai/v1/generation/{engine_id}/text-to-image"
+def to_jpeg_bytes(image):
+    """Compresses an image to JPEG bytes, which are far lighter to keep in session state than a PIL image."""
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
 
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {STABILITY_API_KEY}",
-    }
+def request_stability_image(session, rate_limiter, prompt, quality):
+    """Fetches an image as JPEG bytes from the Stability.ai API (or the disk cache) without touching the Streamlit UI."""
+    preset = IMAGE_QUALITY_PRESETS[quality]
     payload = {
         "text_prompts": [{"text": f"cinematic, epic, high detail, masterpiece, {prompt}"}],
         "cfg_scale": 7,
-        "height": 1024,
-        "width": 1024,
+        "height": preset["height"],
+        "width": preset["width"],
         "samples": 1,
-        "steps": 30,
+        "steps": preset["steps"],
     }
 
+    cache_key = hashlib.sha256(json.dumps({"engine": preset["engine_id"], **payload}, sort_keys=True).encode()).hexdigest()
+    cache_path = CACHE_DIR / "images" / f"{cache_key}.png"
+    if cache_path.exists():
+        try:
+            with Image.open(cache_path) as image:
+                return to_jpeg_bytes(image)
+        except (UnidentifiedImageError, OSError):
+            # A corrupt or truncated entry would otherwise fail forever; drop it and fetch again.
+            cache_path.unlink(missing_ok=True)
+
+    url = STABILITY_API_URL.format(engine_id=preset["engine_id"])
+    for attempt in range(STABILITY_MAX_ATTEMPTS):
+        # Every attempt takes a token, so retries during a 429 storm are paced like any other request.
+        rate_limiter.acquire()
+        response = session.post(url, headers=STABILITY_HEADERS, json=payload, timeout=(5, 60))
+        if response.status_code not in RETRYABLE_STABILITY_STATUSES or attempt == STABILITY_MAX_ATTEMPTS - 1:
+            break
+        retry_after = response.headers.get("Retry-After", "")
+        time.sleep(float(retry_after) if retry_after.isdigit() else min(2 ** attempt, 8) + random.random())
+    response.raise_for_status()
+    write_cache_file(cache_path, response.content)
+    return to_jpeg_bytes(Image.open(io.BytesIO(response.content)))
+
+@st.cache_data
+def generate_image_stability(prompt, quality):
+    """Generates an image using the Stability.ai API with a valid model."""
+    if not STABILITY_API_KEY:
+        st.warning("Stability API Key not found. Image generation is disabled.")
+        return None
+
     with st.spinner("The Stability artist is painting the scene..."):
         try:
-            response = requests.post(API_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            image_b64 = data["artifacts"][0]["base64"]
-            return Image.open(io.BytesIO(base64.b64decode(image_b64)))
+            return request_stability_image(get_stability_session(), get_stability_rate_limiter(), prompt, quality)
         except requests.exceptions.HTTPError as e:
             st.error(f"HTTP error with Stability API: {e.response.status_code}")
             st.json(e.response.json())
@@ -122,34 +321,124 @@ def generate_image_stability(prompt):
             st.error(f"An error occurred with the Stability API: {e}")
             return None
 
+@st.cache_resource
+def get_prefetch_executor():
+    """Shared worker pool for speculative chapter prefetches; its size caps concurrent API calls."""
+    return ThreadPoolExecutor(max_workers=3)
+
+def prefetch_chapter(model, session, gemini_limiter, stability_limiter, story_context, world_bible, user_choice, quality, replay_mode):
+    """Generates a chapter and its image in a worker thread, so it must not call any st.* functions."""
+    prompt = build_chapter_prompt(story_context, world_bible, user_choice)
+    cache_path = gemini_cache_path(prompt, CHAPTER_GENERATION_CONFIG)
+    ai_response = read_gemini_cache(cache_path) if replay_mode else None
+    if ai_response is None:
+        response = with_retry(model.generate_content, prompt, generation_config=CHAPTER_GENERATION_CONFIG, rate_limiter=gemini_limiter)
+        ai_response = parse_chapter_response(response.text)
+        if replay_mode:
+            write_gemini_cache(cache_path, ai_response)
+    image = request_stability_image(session, stability_limiter, ai_response["image_prompt"], quality) if STABILITY_API_KEY else None
+    return ai_response, image
+
+SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])\s+')
+
 # RESTORED: Original browser-based Text-to-Speech function
 def text_to_speech_player(text):
     """Generates a silent autoplaying HTML5 audio player for narration."""
-    safe_text = text.replace("'", "\\'").replace('"', '\\"').replace("\n", " ").strip()
+    # Queue one utterance per sentence so speech starts right away and long sagas aren't cut off mid-way.
+    sentences = [s for s in SENTENCE_BOUNDARY_RE.split(text.replace("\n", " ").strip()) if s]
+    safe_sentences = json.dumps(sentences).replace("</", "<\\/")
     components.html(f"""
         <script>
             // Check if speech is already happening, stop it
             if (window.speechSynthesis.speaking) {{
                 window.speechSynthesis.cancel();
             }}
-            const utterance = new SpeechSynthesisUtterance("{safe_text}");
-            utterance.pitch = 1;
-            utterance.rate = 0.9;
-            window.speechSynthesis.speak(utterance);
+            for (const sentence of {safe_sentences}) {{
+                const utterance = new SpeechSynthesisUtterance(sentence);
+                utterance.pitch = 1;
+                utterance.rate = 0.9;
+                window.speechSynthesis.speak(utterance);
+            }}
         </script>
     """, height=0)
 
+def add_chapter(text, image):
+    """Appends a chapter to the saga and keeps the running full-story text in sync."""
+    st.session_state.story_chapters.append({"text": text, "image": image})
+    st.session_state.full_story_text += (" " if st.session_state.full_story_text else "") + text
+
+def cancel_prefetches():
+    """Cancels every queued prefetch for this session so abandoned branches stop holding the shared workers."""
+    for future in st.session_state.get("prefetch", {}).values():
+        future.cancel()
+    st.session_state.prefetch = {}
+
+# Saved sagas let a refreshed tab resume without regenerating any chapters.
+SESSION_DIR = CACHE_DIR / "session"
+SESSION_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+def get_session_id():
+    """Reads the saga id from the URL, minting a new one if it is missing or malformed."""
+    sid = st.query_params.get("sid", "")
+    if not SESSION_ID_RE.fullmatch(sid):
+        sid = uuid.uuid4().hex
+        st.query_params["sid"] = sid
+    return sid
+
+def prune_sessions():
+    """Deletes saved sagas that have not been touched within the cache TTL."""
+    cutoff = time.time() - GEMINI_CACHE_TTL_SECONDS
+    for path in SESSION_DIR.glob("*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass  # Another process may have removed or replaced it already.
+
+def save_session(sid):
+    """Writes the current saga to disk so it survives a browser refresh."""
+    state = {
+        "app_stage": st.session_state.app_stage,
+        "world_bible": st.session_state.world_bible,
+        "story_chapters": st.session_state.story_chapters,
+        "full_story_text": st.session_state.full_story_text,
+        "latest_choices": st.session_state.latest_choices,
+    }
+    write_cache_file(SESSION_DIR / f"{sid}.pkl", pickle.dumps(state))
+    prune_sessions()
+
+def load_session(sid):
+    """Returns the saga saved for this id, or None if there is none."""
+    try:
+        with open(SESSION_DIR / f"{sid}.pkl", "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+
 
 # --- 3. Streamlit Application UI and Logic ---
 
 st.title("The Multimodal Storyteller 🪶")
 st.markdown("Co-create a unique saga with AI. Forge a world, make choices, and bring your story to life with generated art and audio.")
 
+session_id = get_session_id()
+
 if 'app_stage' not in st.session_state:
     st.session_state.app_stage = "world_forge"
     st.session_state.world_bible = None
     st.session_state.story_chapters = []
+    st.session_state.full_story_text = ""
     st.session_state.latest_choices = []
+    st.session_state.prefetch = {}
+    saved_session = load_session(session_id)
+    if saved_session:
+        for key, value in saved_session.items():
+            st.session_state[key] = value
+
+st.sidebar.header("Settings")
+image_quality = st.sidebar.selectbox("Image quality", list(IMAGE_QUALITY_PRESETS), help="Faster presets render smaller images with fewer diffusion steps.")
+replay_mode = st.sidebar.checkbox("Deterministic replay mode", value=False, help="Reuse chapters already woven for the exact same story and choice instead of asking Gemini again.")
+prefetch_enabled = st.sidebar.checkbox("Prefetch next chapters", value=False, help="Weave all three paths in the background while you read. Uses extra API credits.")
 
 if st.session_state.app_stage == "world_forge":
     with st.form("world_forge_form"):
@@ -160,6 +449,7 @@ if st.session_state.app_stage == "world_forge":
         if st.form_submit_button("Set the Stage"):
             st.session_state.world_bible = generate_world_bible(theme, archetype, contradiction)
             st.session_state.app_stage = "story_start"
+            save_session(session_id)
             st.rerun()
 
 elif st.session_state.app_stage == "story_start":
@@ -168,13 +458,14 @@ elif st.session_state.app_stage == "story_start":
     with st.form("start_story_form"):
         initial_prompt = st.text_area("Your opening sentence:", "The last starship captain woke from cryo-sleep to the sound of a ticking clock.")
         if st.form_submit_button("Start the Saga") and initial_prompt:
-            ai_response = generate_story_chapter(initial_prompt, st.session_state.world_bible, initial_prompt)
+            ai_response = generate_story_chapter(initial_prompt, st.session_state.world_bible, initial_prompt, replay_mode)
             if ai_response:
-                initial_image = generate_image_stability(ai_response["image_prompt"])
-                st.session_state.story_chapters.append({"text": initial_prompt, "image": None})
-                st.session_state.story_chapters.append({"text": ai_response["narrative_chapter"], "image": initial_image})
+                initial_image = generate_image_stability(ai_response["image_prompt"], image_quality)
+                add_chapter(initial_prompt, None)
+                add_chapter(ai_response["narrative_chapter"], initial_image)
                 st.session_state.latest_choices = ai_response["next_choices"]
                 st.session_state.app_stage = "story_cycle"
+                save_session(session_id)
                 st.rerun()
 
 elif st.session_state.app_stage == "story_cycle":
@@ -187,12 +478,11 @@ elif st.session_state.app_stage == "story_cycle":
 
     # RESTORED: Original audio controls
     if st.session_state.story_chapters:
-        full_story_text = " ".join([ch['text'] for ch in st.session_state.story_chapters])
         st.subheader("Narration Controls")
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("🔊 Narrate Story"):
-                text_to_speech_player(full_story_text)
+                text_to_speech_player(st.session_state.full_story_text)
         with col2:
             if st.button("⏸️ Pause/Resume"):
                 # JavaScript to toggle pause/resume
@@ -216,18 +506,58 @@ elif st.session_state.app_stage == "story_cycle":
         with st.form("choice_form"):
             choice_made = st.radio("Choose a path:", st.session_state.latest_choices, key="choice_radio")
             if st.form_submit_button("Weave Next Chapter"):
-                story_so_far = " ".join([ch['text'] for ch in st.session_state.story_chapters])
-                ai_response = generate_story_chapter(story_so_far, st.session_state.world_bible, choice_made)
+                ai_response = None
+                prefetched = st.session_state.prefetch.get((choice_made, image_quality, replay_mode))
+                # A prefetch that never started is cancelled instead of waited on, so the click never queues behind other work.
+                if prefetched and (prefetched.running() or not prefetched.cancel()):
+                    with st.spinner("The Storyteller is weaving the next chapter..."):
+                        try:
+                            ai_response, new_image = prefetched.result()
+                        except Exception:
+                            # Fall back to the regular path, which reports errors to the user.
+                            ai_response = None
+                if not ai_response:
+                    ai_response = generate_story_chapter(st.session_state.full_story_text, st.session_state.world_bible, choice_made, replay_mode)
+                    if ai_response:
+                        new_image = generate_image_stability(ai_response["image_prompt"], image_quality)
                 if ai_response:
-                    new_image = generate_image_stability(ai_response["image_prompt"])
-                    st.session_state.story_chapters.append({"text": ai_response["narrative_chapter"], "image": new_image})
+                    # The unchosen branches are dead now; stop them before they spend more credits.
+                    cancel_prefetches()
+                    add_chapter(ai_response["narrative_chapter"], new_image)
                     st.session_state.latest_choices = ai_response["next_choices"]
+                    save_session(session_id)
                     st.rerun()
 
+        # Speculatively weave every offered path while the user is still reading. Futures are keyed on the
+        # settings they were submitted with, so changing quality or replay mode replaces them.
+        prefetch_keys = [(choice, image_quality, replay_mode) for choice in st.session_state.latest_choices]
+        if not prefetch_enabled:
+            cancel_prefetches()
+        elif any(key not in st.session_state.prefetch for key in prefetch_keys):
+            cancel_prefetches()
+            executor = get_prefetch_executor()
+            st.session_state.prefetch = {
+                (choice, quality, replay): executor.submit(
+                    prefetch_chapter,
+                    get_gemini_model(),
+                    get_stability_session(),
+                    get_gemini_rate_limiter(),
+                    get_stability_rate_limiter(),
+                    st.session_state.full_story_text,
+                    st.session_state.world_bible,
+                    choice,
+                    quality,
+                    replay,
+                )
+                for choice, quality, replay in prefetch_keys
+            }
+
 # --- Restart Button ---
 st.sidebar.markdown("---")
 st.sidebar.header("Controls")
 if st.sidebar.button("Start a New Saga (Restart)"):
+    cancel_prefetches()
+    (SESSION_DIR / f"{session_id}.pkl").unlink(missing_ok=True)
     for key in list(st.session_state.keys()):
         del st.session_state[key]
     st.rerun()